@@ -1,7 +1,15 @@
+import argparse
+import json
 import os
 import re
+import sys
+import tempfile
 from pathlib import Path
-from typing import Dict, Set, List
+from typing import Dict, FrozenSet, Set, List
+
+# Name of the reverse-dependency index file written next to the generated outputs
+IMPACT_INDEX_FILENAME = ".dep_index.json"
+IMPACT_INDEX_VERSION = 1
 
 
 def parse_includes(filepath: str) -> Set[str]:
@@ -232,49 +240,431 @@ def print_topologically_sorted(dependency_tree: Dict[str, Set[str]]):
     return sorted_files
 
 
-if __name__ == "__main__":
-    # Example usage
-    print("Building dependency tree for header files...")
-    print("=" * 60)
+def _reachable(start: str, edges: Dict[str, Set[str]]) -> Set[str]:
+    """
+    Collect every node reachable from start by following edges (start excluded
+    unless it lies on a cycle).
+
+    Args:
+        start: Node to start from
+        edges: Adjacency mapping (forward or reverse edges)
+
+    Returns:
+        Set of reachable nodes
+    """
+    reached = set()
+    stack = list(edges.get(start, set()))
+    while stack:
+        node = stack.pop()
+        if node in reached:
+            continue
+        reached.add(node)
+        stack.extend(edges.get(node, set()) - reached)
+    return reached
+
+
+def build_reverse_tree(dependency_tree: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+    """
+    Invert the dependency tree so each header maps to the headers that include it.
+
+    Args:
+        dependency_tree: Dictionary mapping files to their dependencies
+
+    Returns:
+        Dictionary mapping each header file to the set of headers that directly include it
+    """
+    reverse_tree = {filename: set() for filename in dependency_tree}
+    for filename, dependencies in dependency_tree.items():
+        for dep in dependencies:
+            reverse_tree.setdefault(dep, set()).add(filename)
+    return reverse_tree
+
+
+def _header_signature(h_file: Path) -> Dict[str, int]:
+    """Return the stat fields used to detect whether a header was edited."""
+    stat = h_file.stat()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _index_dependency_tree(headers: Dict[str, dict]) -> Dict[str, Set[str]]:
+    """Build the local dependency tree from the raw includes stored in an index."""
+    available_headers = set(headers)
+    return {
+        name: set(entry["includes"]) & available_headers
+        for name, entry in headers.items()
+    }
+
+
+def get_impact_index_path(output_dir: str = "pyfiles") -> Path:
+    """
+    Return the location of the impact index for a given output directory.
+
+    Args:
+        output_dir: Directory holding the generated Python files (default: "pyfiles")
+
+    Returns:
+        Path of the serialised index file
+    """
+    return Path(output_dir) / IMPACT_INDEX_FILENAME
+
+
+def _is_header_list(value, headers: Dict[str, dict]) -> bool:
+    """Check that a stored edge list is a list of indexed header names."""
+    return isinstance(value, list) and all(
+        isinstance(name, str) and name in headers for name in value
+    )
+
+
+def _is_valid_index(data: Dict) -> bool:
+    """
+    Check that loaded index data has the shape update_impact_index relies on.
+
+    Args:
+        data: Decoded JSON content of the index file
+
+    Returns:
+        True if every header entry is well formed and the reverse edge maps
+        cover exactly the indexed headers
+    """
+    headers = data.get("headers")
+    dependents = data.get("dependents")
+    impacted = data.get("impacted")
+    if not all(isinstance(v, dict) for v in (headers, dependents, impacted)):
+        return False
+
+    for entry in headers.values():
+        if not (
+            isinstance(entry, dict)
+            and isinstance(entry.get("mtime_ns"), int)
+            and isinstance(entry.get("size"), int)
+            and isinstance(entry.get("includes"), list)
+            and all(isinstance(name, str) for name in entry["includes"])
+        ):
+            return False
+
+    for edges in (dependents, impacted):
+        if set(edges) != set(headers):
+            return False
+        if not all(_is_header_list(value, headers) for value in edges.values()):
+            return False
+
+    return True
+
+
+def load_impact_index(output_dir: str = "pyfiles") -> Dict:
+    """
+    Load a previously saved impact index.
+
+    Args:
+        output_dir: Directory holding the generated Python files (default: "pyfiles")
+
+    Returns:
+        The index dictionary, or an empty dictionary if it is missing, unreadable
+        or written by an incompatible version
+    """
+    index_path = get_impact_index_path(output_dir)
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read {index_path}: {e}")
+        return {}
+
+    if not isinstance(data, dict):
+        print(f"Warning: Malformed index {index_path}, rebuilding")
+        return {}
+
+    if data.get("version") != IMPACT_INDEX_VERSION:
+        return {}
 
+    if not _is_valid_index(data):
+        print(f"Warning: Malformed index {index_path}, rebuilding")
+        return {}
+
+    return {
+        "version": data["version"],
+        "headers": data["headers"],
+        "dependents": {k: frozenset(v) for k, v in data["dependents"].items()},
+        "impacted": {k: frozenset(v) for k, v in data["impacted"].items()},
+    }
+
+
+def save_impact_index(index: Dict, output_dir: str = "pyfiles"):
+    """
+    Serialise the impact index next to the generated outputs.
+
+    Args:
+        index: Index dictionary as returned by update_impact_index
+        output_dir: Directory holding the generated Python files (default: "pyfiles")
+    """
+    index_path = get_impact_index_path(output_dir)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "version": index["version"],
+        "headers": index["headers"],
+        "dependents": {k: sorted(v) for k, v in sorted(index["dependents"].items())},
+        "impacted": {k: sorted(v) for k, v in sorted(index["impacted"].items())},
+    }
+    # Use a unique temp file so concurrent writers never clobber each other
+    fd, tmp_path = tempfile.mkstemp(
+        dir=index_path.parent, prefix=IMPACT_INDEX_FILENAME, suffix=".tmp"
+    )
     try:
-        dep_tree = build_dependency_tree("hfiles")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        # mkstemp creates the file 0600; give it the usual umask-based mode
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def update_impact_index(
+    hfiles_dir: str = "hfiles", output_dir: str = "pyfiles", rebuild: bool = False
+) -> Dict:
+    """
+    Bring the reverse-dependency index up to date and save it.
+
+    Only headers that were added, removed or edited since the last run are
+    re-parsed, and only the reverse closures that can have changed are
+    recomputed: those of the changed headers and of every header they reached
+    before or after the change.
+
+    Args:
+        hfiles_dir: Directory containing header files (default: "hfiles")
+        output_dir: Directory holding the generated Python files (default: "pyfiles")
+        rebuild: Ignore any saved index and rebuild from scratch
 
-        print(f"\nFound {len(dep_tree)} header files\n")
+    Returns:
+        Index dictionary with "headers" (per-file signature and raw includes),
+        "dependents" (direct reverse edges) and "impacted" (reverse transitive closure)
+    """
+    hfiles_path = Path(hfiles_dir)
 
-        # Print files in dependency order
-        print("\n" + "=" * 60)
-        print_topologically_sorted(dep_tree)
+    if not hfiles_path.exists():
+        raise FileNotFoundError(f"Directory '{hfiles_dir}' not found")
 
-        # Print full dependency tree
-        print("\n" + "=" * 60)
-        print("Full dependency tree:\n")
-        print_dependency_tree(dep_tree)
+    old_index = {} if rebuild else load_impact_index(output_dir)
+    old_headers = old_index.get("headers", {})
+    old_impacted = old_index.get("impacted", {})
+
+    headers = {}
+    changed = set()
+    for h_file in hfiles_path.glob("*.h"):
+        signature = _header_signature(h_file)
+        entry = old_headers.get(h_file.name)
+        if entry is not None and all(entry[k] == v for k, v in signature.items()):
+            headers[h_file.name] = entry
+            continue
+        includes = parse_includes(str(h_file))
+        headers[h_file.name] = dict(signature, includes=sorted(includes))
+        changed.add(h_file.name)
+
+    removed = set(old_headers) - set(headers)
+    changed |= removed
+
+    if not changed and old_index:
+        return old_index
+
+    old_tree = _index_dependency_tree(old_headers)
+    new_tree = _index_dependency_tree(headers)
+    dependents = {
+        name: frozenset(users) for name, users in build_reverse_tree(new_tree).items()
+    }
+
+    # A header's reverse closure can only change if a changed header reaches it
+    dirty = set()
+    for name in changed:
+        dirty.add(name)
+        dirty |= _reachable(name, old_tree)
+        dirty |= _reachable(name, new_tree)
+
+    impacted = {
+        name: old_impacted[name]
+        for name in headers
+        if name not in dirty and name in old_impacted
+    }
+    for name in headers:
+        if name not in impacted:
+            impacted[name] = frozenset(_reachable(name, dependents))
+
+    index = {
+        "version": IMPACT_INDEX_VERSION,
+        "headers": headers,
+        "dependents": dependents,
+        "impacted": impacted,
+    }
+    save_impact_index(index, output_dir)
+    return index
+
+
+def get_impacted_by(header: str, index: Dict) -> FrozenSet[str]:
+    """
+    Look up every header that directly or indirectly includes the given header.
+
+    Args:
+        header: Header filename (a path is reduced to its filename)
+        index: Index dictionary as returned by update_impact_index or load_impact_index
+
+    Returns:
+        Frozen set of impacted header filenames (empty if the header is unknown)
+    """
+    return index.get("impacted", {}).get(os.path.basename(header), frozenset())
 
-        # Check for circular dependencies
-        print("\n" + "=" * 60)
-        print("Checking for circular dependencies...")
-        cycles = detect_circular_dependencies(dep_tree)
 
-        if cycles:
-            print(f"\n⚠️  Found {len(cycles)} circular dependency cycle(s):")
-            for i, cycle in enumerate(cycles, 1):
-                print(f"\n  Cycle {i}: {' → '.join(cycle)}")
+def get_direct_dependents(header: str, index: Dict) -> FrozenSet[str]:
+    """
+    Look up the headers that directly include the given header.
+
+    Args:
+        header: Header filename (a path is reduced to its filename)
+        index: Index dictionary as returned by update_impact_index or load_impact_index
+
+    Returns:
+        Frozen set of header filenames that include it (empty if the header is unknown)
+    """
+    return index.get("dependents", {}).get(os.path.basename(header), frozenset())
+
+
+def print_impacted_by(headers: List[str], index: Dict) -> bool:
+    """
+    Print the generated modules affected by a change to each of the given headers.
+
+    Args:
+        headers: Header filenames to query
+        index: Index dictionary as returned by update_impact_index
+
+    Returns:
+        True if every header was found in the index, False otherwise
+    """
+    all_found = True
+    for header in headers:
+        name = os.path.basename(header)
+        if name not in index["headers"]:
+            print(f"Warning: {name} is not an indexed header")
+            all_found = False
+            continue
+
+        print(f"📄 {name}")
+        for impacted in sorted({name} | get_impacted_by(name, index)):
+            print(f"    └─ {Path(impacted).stem}.py ({impacted})")
+    return all_found
+
+
+def print_full_report(dep_tree: Dict[str, Set[str]]):
+    """
+    Print the dependency order, tree, cycles and transitive dependencies.
+
+    Args:
+        dep_tree: Dictionary mapping files to their dependencies
+    """
+    print(f"\nFound {len(dep_tree)} header files\n")
+
+    # Print files in dependency order
+    print("\n" + "=" * 60)
+    print_topologically_sorted(dep_tree)
+
+    # Print full dependency tree
+    print("\n" + "=" * 60)
+    print("Full dependency tree:\n")
+    print_dependency_tree(dep_tree)
+
+    # Check for circular dependencies
+    print("\n" + "=" * 60)
+    print("Checking for circular dependencies...")
+    cycles = detect_circular_dependencies(dep_tree)
+
+    if cycles:
+        print(f"\n⚠️  Found {len(cycles)} circular dependency cycle(s):")
+        for i, cycle in enumerate(cycles, 1):
+            print(f"\n  Cycle {i}: {' → '.join(cycle)}")
+    else:
+        print("\n✓ No circular dependencies detected")
+
+    # Show transitive dependencies for each file
+    print("\n" + "=" * 60)
+    print("Transitive dependencies (all dependencies):\n")
+    for filename in sorted(dep_tree.keys()):
+        all_deps = get_all_dependencies(filename, dep_tree)
+        print(f"📄 {filename}")
+        if all_deps:
+            for dep in sorted(all_deps):
+                print(f"    └─ {dep}")
         else:
-            print("\n✓ No circular dependencies detected")
-
-        # Show transitive dependencies for each file
-        print("\n" + "=" * 60)
-        print("Transitive dependencies (all dependencies):\n")
-        for filename in sorted(dep_tree.keys()):
-            all_deps = get_all_dependencies(filename, dep_tree)
-            print(f"📄 {filename}")
-            if all_deps:
-                for dep in sorted(all_deps):
-                    print(f"    └─ {dep}")
-            else:
-                print(f"    (no dependencies)")
-            print()
+            print(f"    (no dependencies)")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Analyse #include dependencies between C header files"
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        default="hfiles",
+        help="Input directory containing .h files (default: hfiles)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="pyfiles",
+        help="Output directory holding the generated .py files and the impact index (default: pyfiles)",
+    )
+    parser.add_argument(
+        "--impacted-by",
+        action="append",
+        metavar="HEADER",
+        help="List the generated modules affected by a change to HEADER (repeatable)",
+    )
+    parser.add_argument(
+        "--rebuild-index",
+        action="store_true",
+        help="Rebuild the impact index from scratch instead of updating it",
+    )
+    parser.add_argument(
+        "--no-refresh",
+        action="store_true",
+        help="Answer --impacted-by from the saved index without re-checking headers "
+        "(the index is only built if it does not exist yet)",
+    )
+
+    args = parser.parse_args()
+
+    try:
+        if args.impacted_by or args.rebuild_index:
+            index = {}
+            if args.no_refresh and not args.rebuild_index:
+                index = load_impact_index(args.output)
+            if not index:
+                index = update_impact_index(
+                    args.input, args.output, args.rebuild_index
+                )
+            if not args.impacted_by:
+                print(
+                    f"✓ Indexed {len(index['headers'])} header files -> "
+                    f"{get_impact_index_path(args.output)}"
+                )
+                return 0
+            return 0 if print_impacted_by(args.impacted_by, index) else 1
+
+        print("Building dependency tree for header files...")
+        print("=" * 60)
+        print_full_report(build_dependency_tree(args.input))
+        return 0
 
     except FileNotFoundError as e:
         print(f"Error: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -81,6 +81,23 @@ def convert_all_headers(input_dir, output_dir):
     return successful, failed
 
 
+def refresh_impact_index(input_dir, output_dir):
+    """
+    Refresh the reverse-dependency index stored next to the generated files
+
+    Args:
+        input_dir (str): Directory containing C header files
+        output_dir (str): Directory holding the generated Python files
+    """
+    from dep_tree import update_impact_index, get_impact_index_path
+
+    try:
+        update_impact_index(input_dir, output_dir)
+        print(f"\n✓ Updated impact index {get_impact_index_path(output_dir)}")
+    except OSError as e:
+        print(f"✗ Could not update impact index in {output_dir}: {e}")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Convert C header files to Python using clang2py"
@@ -115,6 +132,10 @@ def main():
 
         if convert_header_to_python(args.file, str(output_file)):
             print("Single file conversion completed successfully")
+            # The index lives next to the batch outputs and covers args.input only
+            header_dir = Path(args.file).resolve().parent
+            if not args.output_file and header_dir == Path(args.input).resolve():
+                refresh_impact_index(args.input, args.output)
             return 0
         else:
             print("Single file conversion failed")
@@ -140,6 +161,8 @@ def main():
         print("-" * 60)
         deduplicate_structs()
 
+        refresh_impact_index(args.input, args.output)
+
         if failed > 0:
             return 1
 